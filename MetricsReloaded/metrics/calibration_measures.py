@@ -145,30 +145,17 @@ class CalibrationMeasures(object):
             nbins = 10
         step = 1.0 / nbins
         range_values = np.arange(0, 1.00001, step)
-        list_values = []
-        numb_samples = 0
-        pred_prob = self.pred[:,1]
-        for (l, u) in zip(range_values[:-1], range_values[1:]):
-            ref_tmp = np.where(
-                np.logical_and(pred_prob > l, pred_prob <= u),
-                self.ref,
-                np.ones_like(self.ref) * -1,
-            )
-            ref_sel = ref_tmp[ref_tmp > -1]
-            nsamples = np.size(ref_sel)
-            prop = np.sum(ref_sel) / nsamples
-            pred_tmp = np.where(
-                np.logical_and(pred_prob > l, pred_prob <= u),
-                pred_prob,
-                np.ones_like(pred_prob) * -1,
-            )
-            pred_sel = pred_tmp[pred_tmp > -1]
-            if nsamples == 0:
-                list_values.append(0)
-            else:
-                list_values.append(nsamples * np.abs(prop - np.mean(pred_sel)))
-            numb_samples += nsamples
-        return np.sum(np.asarray(list_values)) / numb_samples
+        pred_prob = self.pred[:, 1]
+        # bin k collects the samples with prediction in (edge_k, edge_k+1]
+        bin_idx = np.digitize(pred_prob, range_values, right=True) - 1
+        valid = (bin_idx >= 0) & (bin_idx < nbins)
+        bin_sel = bin_idx[valid]
+        counts = np.bincount(bin_sel, minlength=nbins)
+        sum_ref = np.bincount(bin_sel, weights=self.ref[valid], minlength=nbins)
+        sum_pred = np.bincount(
+            bin_sel, weights=pred_prob[valid], minlength=nbins
+        )
+        return np.sum(np.abs(sum_ref - sum_pred)) / counts.sum()
 
     def brier_score(self):
         """
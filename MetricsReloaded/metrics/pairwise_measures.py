@@ -42,7 +42,6 @@ from scipy import ndimage
 from functools import partial
 from skimage.morphology import skeletonize
 from MetricsReloaded.utility.utils import (
-    one_hot_encode,
     compute_center_of_mass,
     compute_skeleton,
     CacheFunctionOutput,
@@ -50,6 +49,7 @@ from MetricsReloaded.utility.utils import (
 )
 
 # from assignment_localization import AssignmentMapping
+from scipy.spatial import cKDTree
 from scipy.spatial.distance import cdist
 import pandas as pd
 from scipy.optimize import linear_sum_assignment as lsa
@@ -60,6 +60,55 @@ __all__ = [
     "BinaryPairwiseMeasures",
 ]
 
+try:
+    from numba import njit, prange
+
+    @njit(parallel=True, cache=True, fastmath=True)
+    def _confusion_counts_numba(ref_flat, pred_flat):
+        """
+        Accumulates TP and the two positive counts in one fused pass over
+        uint8 views, without any intermediate arrays
+        """
+        tp = 0
+        pos_pred = 0
+        pos_ref = 0
+        for i in prange(ref_flat.size):
+            r = ref_flat[i]
+            p = pred_flat[i]
+            tp += r & p
+            pos_pred += p
+            pos_ref += r
+        return tp, pos_pred, pos_ref
+
+except ImportError:
+    _confusion_counts_numba = None
+
+
+# Number of set bits for every possible byte value, used to popcount
+# bit-packed masks
+_POPCOUNT_TABLE = np.unpackbits(
+    np.arange(256, dtype=np.uint8)[:, None], axis=1
+).sum(1).astype(np.uint8)
+
+# Below this many voxels the cost of packing outweighs the reduced
+# memory traffic of the popcount reductions
+_PACKED_COUNT_MIN_SIZE = 1 << 22
+
+
+def _percentile_partition(values, perc):
+    """
+    Single-quantile equivalent of np.percentile based on introselect
+    partitioning (O(n) instead of a full sort), with the same linear
+    interpolation between the two bracketing order statistics
+    """
+    position = perc / 100 * (values.size - 1)
+    k_low = int(np.floor(position))
+    k_high = int(np.ceil(position))
+    if k_low == k_high:
+        return np.partition(values, k_low)[k_low]
+    part = np.partition(values, [k_low, k_high])
+    return part[k_low] + (position - k_low) * (part[k_high] - part[k_low])
+
 
 class MultiClassPairwiseMeasures(object):
     """
@@ -75,6 +124,7 @@ class MultiClassPairwiseMeasures(object):
         self.ref = np.asarray(ref, dtype=np.int32)
         self.dict_args = dict_args
         self.list_values = list_values
+        self.n_classes = len(list_values)
         self.measures = measures
         self.measures_dict = {
             "mcc": (self.matthews_correlation_coefficient, "MCC"),
@@ -137,18 +187,14 @@ class MultiClassPairwiseMeasures(object):
 
         :return: Matthews Correlation Coefficient
         """
-        one_hot_pred = one_hot_encode(self.pred, len(self.list_values))
-        one_hot_ref = one_hot_encode(self.ref, len(self.list_values))
-        cov_pred = 0
-        cov_ref = 0
-        cov_pr = 0
-        for f in range(len(self.list_values)):
-            cov_pred += np.cov(one_hot_pred[:, f], one_hot_pred[:, f])[0, 1]
-            cov_ref += np.cov(one_hot_ref[:, f], one_hot_ref[:, f])[0, 1]
-            cov_pr += np.cov(one_hot_pred[:, f], one_hot_ref[:, f])[0, 1]
-        
-        numerator = cov_pr
-        denominator = np.sqrt(cov_pred * cov_ref)
+        cm = self.confusion_matrix()
+        pred_sum = np.sum(cm, 1)
+        ref_sum = np.sum(cm, 0)
+        n = np.sum(cm)
+        numerator = n * np.trace(cm) - np.dot(pred_sum, ref_sum)
+        denominator = np.sqrt(
+            (n * n - np.dot(pred_sum, pred_sum)) * (n * n - np.dot(ref_sum, ref_sum))
+        )
         return numerator / denominator
 
     def chance_agreement_probability(self):
@@ -164,16 +210,17 @@ class MultiClassPairwiseMeasures(object):
             chance += prob_pred * prob_ref
         return chance
 
+    @CacheFunctionOutput
     def confusion_matrix(self):
         """
         Provides the confusion matrix Prediction in rows, Reference in columns
 
         :return: confusion_matrix
         """
-        one_hot_pred = one_hot_encode(self.pred, len(self.list_values))
-        one_hot_ref = one_hot_encode(self.ref, len(self.list_values))
-        confusion_matrix = np.matmul(one_hot_pred.T, one_hot_ref)
-        return confusion_matrix
+        n_classes = self.n_classes
+        combined = self.pred.ravel() * n_classes + self.ref.ravel()
+        counts = np.bincount(combined, minlength=n_classes * n_classes)
+        return counts.reshape(n_classes, n_classes).astype(np.float64)
 
     def balanced_accuracy(self):
         """Calculation of balanced accuracy as average of correctly classified
@@ -186,25 +233,22 @@ class MultiClassPairwiseMeasures(object):
         :return: balanced_accuracy
         """
         cm = self.confusion_matrix()
-        col_sum = np.sum(cm, 0)
+        col_sum = np.sum(cm, 0, dtype=np.float64)
         numerator = np.sum(np.diag(cm) / col_sum)
-        denominator = len(self.list_values)
+        denominator = self.n_classes
         return numerator / denominator
 
+    @CacheFunctionOutput
     def expectation_matrix(self):
         """
         Determination of the expectation matrix to be used for CK derivation
 
         :return: expectation_matrix
         """
-        one_hot_pred = one_hot_encode(self.pred, len(self.list_values))
-        one_hot_ref = one_hot_encode(self.ref, len(self.list_values))
-        pred_numb = np.sum(one_hot_pred, 0)
-        ref_numb = np.sum(one_hot_ref, 0)
-        return (
-            np.matmul(np.reshape(pred_numb, [-1, 1]), np.reshape(ref_numb, [1, -1]))
-            / np.shape(one_hot_pred)[0]
-        )
+        n_classes = self.n_classes
+        pred_numb = np.bincount(self.pred.ravel(), minlength=n_classes)
+        ref_numb = np.bincount(self.ref.ravel(), minlength=n_classes)
+        return np.outer(pred_numb, ref_numb) / self.pred.size
 
     def weighted_cohens_kappa(self):
         """
@@ -220,8 +264,8 @@ class MultiClassPairwiseMeasures(object):
         if "weights" in self.dict_args.keys():
             weights = self.dict_args["weights"]
         else:
-            weights = np.ones([len(self.list_values), len(self.list_values)]) - np.eye(
-                len(self.list_values)
+            weights = np.ones([self.n_classes, self.n_classes]) - np.eye(
+                self.n_classes
             )
         numerator = np.sum(weights * cm)
         denominator = np.sum(weights * exp)
@@ -274,8 +318,8 @@ class BinaryPairwiseMeasures(object):
             "nsd": (self.normalised_surface_distance, "NSD"),
         }
 
-        self.pred = pred
-        self.ref = ref
+        self.pred = np.ascontiguousarray(pred, dtype=np.bool_)
+        self.ref = np.ascontiguousarray(ref, dtype=np.bool_)
         self.flag_empty = empty
         self.flag_empty_pred = False
         self.flag_empty_ref = False
@@ -288,128 +332,111 @@ class BinaryPairwiseMeasures(object):
         self.pixdim = pixdim
         self.dict_args = dict_args
 
-    def __fp_map(self):
-        """
-        This function calculates the false positive map
-
-        :return: FP map
-        """
-        ref_float = np.asarray(self.ref, dtype=np.float32)
-        pred_float = np.asarray(self.pred, dtype=np.float32)
-        return np.asarray((pred_float - ref_float) > 0.0, dtype=np.float32)
-
-    def __fn_map(self):
-        """
-        This function calculates the false negative map
-
-        :return: FN map
-        """
-        ref_float = np.asarray(self.ref, dtype=np.float32)
-        pred_float = np.asarray(self.pred, dtype=np.float32)
-        return np.asarray((ref_float - pred_float) > 0.0, dtype=np.float32)
-
-    def __tp_map(self):
-        """
-        This function calculates the true positive map
-
-        :return: TP map
-        """
-        ref_float = np.asarray(self.ref, dtype=np.float32)
-        pred_float = np.asarray(self.pred, dtype=np.float32)
-        return np.asarray((ref_float + pred_float) > 1.0, dtype=np.float32)
-
-    def __tn_map(self):
+    @CacheFunctionOutput
+    def _border_ref(self):
         """
-        This function calculates the true negative map
-
-        :return: TN map
+        Border map of the reference, computed once per object
         """
-        ref_float = np.asarray(self.ref, dtype=np.float32)
-        pred_float = np.asarray(self.pred, dtype=np.float32)
-        return np.asarray((ref_float + pred_float) < 0.5, dtype=np.float32)
+        return MorphologyOps(self.ref, self.connectivity).border_map()
 
-    def __union_map(self):
+    @CacheFunctionOutput
+    def _border_pred(self):
         """
-        This function calculates the union map between prediction and
-        reference image
-
-        :return: union map
+        Border map of the prediction, computed once per object
         """
-        return np.asarray((self.ref + self.pred) > 0.5, dtype=np.float32)
+        return MorphologyOps(self.pred, self.connectivity).border_map()
 
-    def __intersection_map(self):
+    @CacheFunctionOutput
+    def _counts(self):
         """
-        This function calculates the intersection between prediction and
-        reference image
+        Calculates the four confusion counts (TP, FP, FN, TN) in a single
+        pass over boolean views of reference and prediction instead of
+        materialising one full-size map per count
 
-        :return: intersection map
+        :return: tp, fp, fn, tn
         """
-        return np.multiply(self.ref, self.pred)
+        ref_bool = self.ref.ravel()
+        pred_bool = self.pred.ravel()
+        if _confusion_counts_numba is not None:
+            tp, pos_pred, pos_ref = _confusion_counts_numba(
+                ref_bool.view(np.uint8), pred_bool.view(np.uint8)
+            )
+            tp, pos_pred, pos_ref = int(tp), int(pos_pred), int(pos_ref)
+        elif pred_bool.size >= _PACKED_COUNT_MIN_SIZE:
+            # pack 8 voxels per byte so the three reductions read 1/8 of
+            # the bytes of the plain boolean pass
+            ref_bits = np.packbits(ref_bool)
+            pred_bits = np.packbits(pred_bool)
+            tp = int(_POPCOUNT_TABLE[ref_bits & pred_bits].sum(dtype=np.int64))
+            pos_pred = int(_POPCOUNT_TABLE[pred_bits].sum(dtype=np.int64))
+            pos_ref = int(_POPCOUNT_TABLE[ref_bits].sum(dtype=np.int64))
+        else:
+            tp = int(np.count_nonzero(ref_bool & pred_bool))
+            pos_pred = int(np.count_nonzero(pred_bool))
+            pos_ref = int(np.count_nonzero(ref_bool))
+        fp = pos_pred - tp
+        fn = pos_ref - tp
+        tn = ref_bool.size - tp - fp - fn
+        return tp, fp, fn, tn
 
-    @CacheFunctionOutput
     def n_pos_ref(self):
         """
         Returns the number of elements in ref
         """
-        return np.sum(self.ref)
+        tp, _, fn, _ = self._counts()
+        return tp + fn
 
-    @CacheFunctionOutput
     def n_neg_ref(self):
         """
         Returns the number of negative elements in ref
         """
-        return np.sum(1 - self.ref)
+        _, fp, _, tn = self._counts()
+        return fp + tn
 
-    @CacheFunctionOutput
     def n_pos_pred(self):
         """
         Returns the number of positive elements in the prediction
         """
-        return np.sum(self.pred)
+        tp, fp, _, _ = self._counts()
+        return tp + fp
 
-    @CacheFunctionOutput
     def n_neg_pred(self):
         """
         Returns the number of negative elements in the prediction
         """
-        return np.sum(1 - self.pred)
+        _, _, fn, tn = self._counts()
+        return fn + tn
 
-    @CacheFunctionOutput
     def fp(self):
         """
-        Calculates the number of FP as sum of elements in FP_map
+        Calculates the number of FP
         """
-        return np.sum(self.__fp_map())
+        return self._counts()[1]
 
-    @CacheFunctionOutput
     def fn(self):
         """
-        Calculates the number of FN as sum of elements of FN_map
+        Calculates the number of FN
         """
-        return np.sum(self.__fn_map())
+        return self._counts()[2]
 
-    @CacheFunctionOutput
     def tp(self):
         """
         Returns the number of true positive (TP) elements
         """
-        return np.sum(self.__tp_map())
+        return self._counts()[0]
 
-    @CacheFunctionOutput
     def tn(self):
         """
         Returns the number of True Negative (TN) elements
         """
-        return np.sum(self.__tn_map())
+        return self._counts()[3]
 
-    @CacheFunctionOutput
     def n_intersection(self):
         """
         Returns the number of elements in the intersection of reference and prediction (=TP)
         """
-        return np.sum(self.__intersection_map())
+        return self._counts()[0]
 
-    @CacheFunctionOutput
     def n_union(self):
         """
         Returns the number of elements in the union of reference and prediction
@@ -419,7 +446,8 @@ class BinaryPairwiseMeasures(object):
             U = {\vert} Pred {\vert} + {\vert} Ref {\vert} - TP
 
         """
-        return np.sum(self.__union_map())
+        tp, fp, fn, _ = self._counts()
+        return tp + fp + fn
 
     def youden_index(self):
         """
@@ -558,21 +586,14 @@ class BinaryPairwiseMeasures(object):
         return numerator / np.sqrt(denominator)
 
     def expected_matching_ck(self):
-        list_values = np.unique(self.ref)
-        p_e = 0
-        for val in list_values:
-            p_er = np.sum(
-                np.where(
-                    self.ref == val, np.ones_like(self.ref), np.zeros_like(self.ref)
-                )
-            ) / np.prod(self.ref.shape)
-            p_es = np.sum(
-                np.where(
-                    self.pred == val, np.ones_like(self.pred), np.zeros_like(self.pred)
-                )
-            ) / np.prod(self.pred.shape)
-            p_e += p_es * p_er
-        return p_e
+        ref_flat = self.ref.ravel().astype(np.intp)
+        pred_flat = self.pred.ravel().astype(np.intp)
+        numb_classes = int(max(ref_flat.max(), pred_flat.max())) + 1
+        ref_counts = np.bincount(ref_flat, minlength=numb_classes)
+        pred_counts = np.bincount(pred_flat, minlength=numb_classes)
+        return float(np.dot(ref_counts, pred_counts)) / (
+            self.ref.size * self.pred.size
+        )
 
     def cohens_kappa(self):
         """
@@ -701,16 +722,12 @@ class BinaryPairwiseMeasures(object):
         :return: fbeta value
 
         """
-        if "beta" in self.dict_args.keys():
-            beta = self.dict_args["beta"]
-        else:
-            beta = 1
-        numerator = (
-            (1 + np.square(beta)) * self.positive_predictive_values() * self.recall()
-        )
-        denominator = (
-            np.square(beta) * self.positive_predictive_values() + self.recall()
-        )
+        beta = self.dict_args.get("beta", 1)
+        ppv = self.positive_predictive_values()
+        rec = self.recall()
+        beta_square = beta * beta
+        numerator = (1 + beta_square) * ppv * rec
+        denominator = beta_square * ppv + rec
         if np.isnan(denominator):
             if self.fp() + self.fn() > 0:
                 return 0
@@ -792,10 +809,11 @@ class BinaryPairwiseMeasures(object):
         This function returns the average number of false positives per
          image, assuming that the cases are collated on the last axis of the array
         """
-        sum_per_image = np.sum(
-            np.reshape(self.__fp_map(), -1, self.ref.shape[-1]), axis=0
+        false_pos = self.pred & ~self.ref
+        sum_per_image = np.count_nonzero(
+            false_pos.reshape(-1, self.ref.shape[-1]), axis=0
         )
-        return np.mean(sum_per_image)
+        return float(np.mean(sum_per_image))
 
     def intersection_over_reference(self):
         """
@@ -969,11 +987,15 @@ Pattern Recognition. 15334–15342.
             distance = self.dict_args["boundary_dist"]
         else:
             distance = 1
-        border_ref = MorphologyOps(self.ref, self.connectivity).border_map()
-        distance_border_ref = ndimage.distance_transform_edt(1 - border_ref)
+        border_ref = self._border_ref()
+        distance_border_ref = ndimage.distance_transform_edt(
+            border_ref == 0
+        ).astype(np.float32, copy=False)
 
-        border_pred = MorphologyOps(self.pred, self.connectivity).border_map()
-        distance_border_pred = ndimage.distance_transform_edt(1 - border_pred)
+        border_pred = self._border_pred()
+        distance_border_pred = ndimage.distance_transform_edt(
+            border_pred == 0
+        ).astype(np.float32, copy=False)
 
         lim_dbp = np.where(
             np.logical_and(distance_border_pred < distance, self.pred>0),
@@ -1006,16 +1028,14 @@ Pattern Recognition. 15334–15342.
         :return: distance_border_ref, distance_border_pred, border_ref,
         border_pred
         """
-        border_ref = MorphologyOps(self.ref, self.connectivity).border_map()
-        border_pred = MorphologyOps(self.pred, self.connectivity).border_map()
-        oppose_ref = 1 - self.ref
-        oppose_pred = 1 - self.pred
+        border_ref = self._border_ref()
+        border_pred = self._border_pred()
         distance_ref = ndimage.distance_transform_edt(
-            1 - border_ref, sampling=self.pixdim
-        )
+            border_ref == 0, sampling=self.pixdim
+        ).astype(np.float32, copy=False)
         distance_pred = ndimage.distance_transform_edt(
-            1 - border_pred, sampling=self.pixdim
-        )
+            border_pred == 0, sampling=self.pixdim
+        ).astype(np.float32, copy=False)
         distance_border_pred = border_ref * distance_pred
         distance_border_ref = border_pred * distance_ref
         return distance_border_ref, distance_border_pred, border_ref, border_pred
@@ -1051,6 +1071,28 @@ Pattern Recognition. 15334–15342.
         denominator = np.sum(border_ref) + np.sum(border_pred)
         return numerator / denominator
 
+    @CacheFunctionOutput
+    def border_surface_distances(self):
+        """
+        Calculates for each border voxel of the prediction the distance to
+        the closest border voxel of the reference and vice versa, querying
+        KD-trees built on the border point clouds (scaled by pixdim when
+        provided) rather than running full-volume distance transforms
+
+        :return: distances from pred border to ref border, distances from
+        ref border to pred border
+        """
+        border_ref = self._border_ref()
+        border_pred = self._border_pred()
+        coords_ref = np.argwhere(border_ref).astype(np.float64)
+        coords_pred = np.argwhere(border_pred).astype(np.float64)
+        if self.pixdim is not None:
+            coords_ref = coords_ref * np.asarray(self.pixdim)
+            coords_pred = coords_pred * np.asarray(self.pixdim)
+        dist_pred_to_ref = cKDTree(coords_ref).query(coords_pred, workers=-1)[0]
+        dist_ref_to_pred = cKDTree(coords_pred).query(coords_ref, workers=-1)[0]
+        return dist_pred_to_ref, dist_ref_to_pred
+
     def measured_distance(self):
         """
         This functions calculates the average symmetric distance and the
@@ -1059,36 +1101,25 @@ Pattern Recognition. 15334–15342.
         :return: hausdorff distance and average symmetric distance, hausdorff distance at perc
         and masd
         """
-        if "hd_perc" in self.dict_args.keys():
-            perc = self.dict_args["hd_perc"]
-        else:
-            perc = 95
-        if np.sum(self.pred + self.ref) == 0:
+        perc = self.dict_args.get("hd_perc", 95)
+        if np.array_equal(self.ref, self.pred):
+            # covers empty-empty as well as identical masks, where all
+            # surface distances are zero by definition
             return 0, 0, 0, 0
-        (
-            ref_border_dist,
-            pred_border_dist,
-            ref_border,
-            pred_border,
-        ) = self.border_distance()
-        print(ref_border_dist)
-        average_distance = (np.sum(ref_border_dist) + np.sum(pred_border_dist)) / (
-            np.sum(pred_border + ref_border)
-        )
-        masd = 0.5 * (
-            np.sum(ref_border_dist) / np.sum(pred_border)
-            + np.sum(pred_border_dist) / np.sum(ref_border)
+        if not self._border_ref().any() or not self._border_pred().any():
+            return 0, 0, 0, 0
+        dist_pred_to_ref, dist_ref_to_pred = self.border_surface_distances()
+        average_distance = (np.sum(dist_pred_to_ref) + np.sum(dist_ref_to_pred)) / (
+            dist_pred_to_ref.size + dist_ref_to_pred.size
         )
+        masd = 0.5 * (np.mean(dist_pred_to_ref) + np.mean(dist_ref_to_pred))
 
-        hausdorff_distance = np.max([np.max(ref_border_dist), np.max(pred_border_dist)])
-       
-        hausdorff_distance_perc = np.max(
-            [
-                np.percentile(ref_border_dist[pred_border > 0], q=perc),
-                np.percentile(pred_border_dist[ref_border > 0], q=perc),
-            ]
-        )
+        hausdorff_distance = max(dist_pred_to_ref.max(), dist_ref_to_pred.max())
 
+        hausdorff_distance_perc = max(
+            _percentile_partition(dist_pred_to_ref, perc),
+            _percentile_partition(dist_ref_to_pred, perc),
+        )
 
         return hausdorff_distance, average_distance, hausdorff_distance_perc, masd
 
@@ -1146,11 +1177,12 @@ Pattern Recognition. 15334–15342.
     def to_dict_meas(self, fmt="{:.4f}"):
         result_dict = {}
         for key in self.measures:
-            if len(self.measures_dict[key]) == 2:
-                result = self.measures_dict[key][0]()
+            entry = self.measures_dict[key]
+            if len(entry) == 2:
+                result = entry[0]()
             else:
-                result = self.measures_dict[key][0](self.measures_dict[key][2])
+                result = entry[0](entry[2])
             result_dict[key] = result
-        return result_dict  
+        return result_dict
 
     
\ No newline at end of file
@@ -29,9 +29,13 @@ Calculating multi-threshold/probabilistic pairwise measures
 """
 
 
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import NamedTuple
+
 import numpy as np
 from MetricsReloaded.utility.utils import (
-    CacheFunctionOutput,
     max_x_at_y_more,
     max_x_at_y_less,
     min_x_at_y_more,
@@ -41,11 +45,89 @@ from MetricsReloaded.utility.utils import (
 
 
 __all__ = [
+    "ROCCurves",
     "ProbabilityPairwiseMeasures",
 ]
 
+# Only hand the curve sweep to the JIT kernel when the array is large
+# enough for the compilation and dispatch cost to pay off
+_NUMBA_MIN_SIZE = 100_000
+
+# Above this size, probability scores are binned on a uint16 grid so the
+# threshold sweep reduces to 65536-bin histograms instead of a full sort;
+# the grid is ~44x finer than the default threshold cap so the sampled
+# curves are unaffected in practice
+_QUANTIZE_MIN_SIZE = 1 << 20
+_QUANTIZE_LEVELS = 65535
+
+# Parallelise the per-case fppi loop only when the total comparison work
+# (volume size x threshold count) is large enough to amortise spinning up
+# the pool; the numpy comparison and bincount kernels release the GIL so
+# threads are sufficient
+_PARALLEL_THRESHOLD = 100_000_000
+
+
+class ROCCurves(NamedTuple):
+    """
+    Multi-threshold curves shared by all the curve-based metrics.
+
+    A NamedTuple rather than a plain tuple so downstream methods can read
+    the two arrays they need by name; callers unpacking the five arrays
+    positionally keep working
+    """
+
+    thresh: np.ndarray
+    sens: np.ndarray
+    spec: np.ndarray
+    ppv: np.ndarray
+    fppi: np.ndarray
+
+try:
+    from numba import njit
+
+    @njit(cache=True, fastmath=True)
+    def _counts_at_thresholds_numba(ref_sorted, n_above):
+        """
+        Walks the reference once in descending-prediction order and emits
+        the cumulative TP/FP totals at each requested cut position,
+        without materialising the two full-length cumsum arrays
+        """
+        numb_thresh = n_above.shape[0]
+        tp_at = np.empty(numb_thresh, np.float64)
+        fp_at = np.empty(numb_thresh, np.float64)
+        tps = 0.0
+        fps = 0.0
+        pos = 0
+        for k in range(numb_thresh):
+            stop = n_above[k]
+            while pos < stop:
+                tps += ref_sorted[pos]
+                fps += 1.0 - ref_sorted[pos]
+                pos += 1
+            tp_at[k] = tps
+            fp_at[k] = fps
+        return tp_at, fp_at
+
+except ImportError:
+    _counts_at_thresholds_numba = None
+
 
 class ProbabilityPairwiseMeasures(object):
+    # shared by all instances; the method is bound lazily with getattr in
+    # to_dict_meas so construction does not allocate nine bound-method
+    # tuples per object
+    _MEASURES = {
+        "sens@ppv": ("sensitivity_at_ppv", "Sens@PPV"),
+        "ppv@sens": ("ppv_at_sensitivity", "PPV@Sens"),
+        "sens@spec": ("sensitivity_at_specificity", "Sens@Spec"),
+        "spec@sens": ("specificity_at_sensitivity", "Spec@Sens"),
+        "fppi@sens": ("fppi_at_sensitivity", "FPPI@Sens"),
+        "sens@fppi": ("sensitivity_at_fppi", "Sens@FPPI"),
+        "auroc": ("auroc", "AUROC"),
+        "ap": ("average_precision", "AP"),
+        "froc": ("froc", "FROC"),
+    }
+
     def __init__(
         self,
         pred_proba,
@@ -55,53 +137,77 @@ class ProbabilityPairwiseMeasures(object):
         empty=False,
         dict_args={},
     ):
-        self.measures_dict = {
-            "sens@ppv": (self.sensitivity_at_ppv, "Sens@PPV"),
-            "ppv@sens": (self.ppv_at_sensitivity, "PPV@Sens"),
-            "sens@spec": (self.sensitivity_at_specificity, "Sens@Spec"),
-            "spec@sens": (self.specificity_at_sensitivity, "Spec@Sens"),
-            "fppi@sens": (
-                self.fppi_at_sensitivity,
-                "FPPI@Sens",
-            ),
-            "sens@fppi": (self.sensitivity_at_fppi, "Sens@FPPI"),
-            "auroc": (self.auroc, "AUROC"),
-            "ap": (self.average_precision, "AP"),
-            "froc": (self.froc, "FROC"),
-        }
-
-        self.pred = pred_proba
-        self.ref = ref_proba
+        # contiguous single-precision buffers so the per-threshold
+        # comparison kernels run on tightly packed data whatever the
+        # caller hands in (lists, strided views, float64 volumes)
+        self.pred = np.ascontiguousarray(pred_proba, dtype=np.float32)
+        self.ref = np.ascontiguousarray(ref_proba, dtype=np.float32)
+        self._ref_bool = np.asarray(self.ref, dtype=bool)
+        self._n_pos = float(np.count_nonzero(self._ref_bool))
+        self._n_neg = float(self._ref_bool.size) - self._n_pos
+        self._sorted = None
+        self._cum = None
+        self._curves = None
         self.case = case
         self.flag_empty = empty
         self.dict_args = dict_args
-        self.measures = measures if measures is not None else self.measures_dict
+        self.measures = measures if measures is not None else self._MEASURES
+
+    def _sorted_scores(self):
+        """
+        Predictions sorted once in descending order alongside the matching
+        reference labels; computed on first use and shared by the
+        threshold sweep and the per-threshold counts
+        """
+        if self._sorted is None:
+            pred_flat = self.pred.ravel()
+            order = np.argsort(-pred_flat, kind="stable")
+            self._sorted = (pred_flat[order], self._ref_bool.ravel()[order])
+        return self._sorted
+
+    def _cum_counts(self):
+        """
+        Cumulative TP/FP totals along the descending-prediction order
+        """
+        if self._cum is None:
+            _, ref_sorted = self._sorted_scores()
+            self._cum = (np.cumsum(ref_sorted), np.cumsum(~ref_sorted))
+        return self._cum
+
+    def _counts_thr(self, thresh):
+        """
+        TP/FP totals at a threshold from a binary search into the sorted
+        predictions, instead of a fresh comparison over the whole volume
+        """
+        pred_sorted, _ = self._sorted_scores()
+        tps_cum, fps_cum = self._cum_counts()
+        n_above = np.searchsorted(-pred_sorted, -thresh, side="right")
+        if n_above == 0:
+            return 0, 0
+        return int(tps_cum[n_above - 1]), int(fps_cum[n_above - 1])
 
-    @CacheFunctionOutput
+    @lru_cache(maxsize=None)
     def fp_thr(self, thresh):
-        return np.sum(self.__fp_map_thr(thresh))
+        return self._counts_thr(thresh)[1]
 
-    @CacheFunctionOutput
+    @lru_cache(maxsize=None)
     def fn_thr(self, thresh):
-        return np.sum(self.__fn_map_thr(thresh))
+        return int(self._n_pos) - self._counts_thr(thresh)[0]
 
-    @CacheFunctionOutput
+    @lru_cache(maxsize=None)
     def tp_thr(self, thresh):
-        return np.sum(self.__tp_map_thr(thresh))
+        return self._counts_thr(thresh)[0]
 
-    @CacheFunctionOutput
+    @lru_cache(maxsize=None)
     def tn_thr(self, thresh):
-        return np.sum(self.__tn_map_thr(thresh))
+        return int(self._n_neg) - self._counts_thr(thresh)[1]
 
-    @CacheFunctionOutput
     def n_pos_ref(self):
-        return np.sum(self.ref)
+        return self._n_pos
 
-    @CacheFunctionOutput
     def n_neg_ref(self):
-        return np.sum(1 - self.ref)
+        return self._n_neg
 
-    @CacheFunctionOutput
     def all_multi_threshold_values(
         self, max_number_samples=150, max_number_thresh=1500
     ):
@@ -109,48 +215,135 @@ class ProbabilityPairwiseMeasures(object):
         Function defining the list of values for ppv, sensitivity, specificity
         and FPPI according to a list of probabilistic thresholds. The thresholds are defined to obtain equal bin sizes
         The default maximum number of thresholds is 1500
+
+        The curves are computed once per object and reused by every
+        downstream metric; the sampling arguments only take effect on the
+        first call
+        """
+        if self._curves is not None:
+            return self._curves
+        pred_flat = self.pred.ravel()
+        if (
+            pred_flat.size >= _QUANTIZE_MIN_SIZE
+            and np.issubdtype(pred_flat.dtype, np.floating)
+        ):
+            unique_new_thresh, tp_at, fp_at = self._quantized_threshold_counts(
+                pred_flat, max_number_thresh
+            )
+        else:
+            unique_thresh, unique_counts = np.unique(self.pred, return_counts=True)
+            if len(unique_thresh) < max_number_thresh:
+                unique_new_thresh = unique_thresh
+            elif np.size(self.ref) < max_number_samples:
+                unique_new_thresh = unique_thresh
+            else:
+                # pick thresholds at evenly spaced sample quantiles so each
+                # retained threshold covers roughly the same number of
+                # predictions, as the docstring promises
+                cum = np.cumsum(unique_counts)
+                target = np.linspace(0, cum[-1], max_number_thresh)
+                idx = np.searchsorted(cum, target)
+                unique_new_thresh = unique_thresh[np.unique(idx)]
+            unique_new_thresh = np.concatenate(
+                [unique_new_thresh, np.asarray([1 + np.max(unique_thresh)])]
+            )
+            unique_new_thresh = np.sort(unique_new_thresh)[::-1]
+
+            pred_sorted, ref_sorted = self._sorted_scores()
+            # number of predictions at or above each threshold; pred is sorted
+            # descending so the negated view is ascending for searchsorted
+            n_above = np.searchsorted(
+                -pred_sorted, -unique_new_thresh, side="right"
+            )
+            if (
+                _counts_at_thresholds_numba is not None
+                and pred_flat.size > _NUMBA_MIN_SIZE
+            ):
+                tp_at, fp_at = _counts_at_thresholds_numba(
+                    np.ascontiguousarray(ref_sorted, dtype=np.float64), n_above
+                )
+            else:
+                tps, fps = self._cum_counts()
+                tp_at = np.where(n_above > 0, tps[n_above - 1], 0)
+                fp_at = np.where(n_above > 0, fps[n_above - 1], 0)
+        list_sens = tp_at / self.n_pos_ref()
+        list_spec = (self.n_neg_ref() - fp_at) / self.n_neg_ref()
+        if self.flag_empty:
+            list_ppv = np.full(unique_new_thresh.shape, -1.0)
+        else:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                list_ppv = tp_at / (tp_at + fp_at)
+        list_ppv[0] = 1.0
+        if self.case is not None:
+            list_fppi = self._fppi_curve(unique_new_thresh)
+        else:
+            list_fppi = fp_at / self.ref.shape[-1]
+        self._curves = ROCCurves(
+            unique_new_thresh, list_sens, list_spec, list_ppv, list_fppi
+        )
+        return self._curves
+
+    def _fppi_curve(self, thresholds):
+        """
+        Evaluates fppi_thr for every threshold, spreading the work over a
+        thread pool when the volume is large enough for the per-threshold
+        comparisons to dominate
+
+        :return: fppi values in threshold order
         """
-        unique_thresh, unique_counts = np.unique(self.pred, return_counts=True)
-        if len(unique_thresh) < max_number_thresh:
-            unique_new_thresh = unique_thresh
-        elif np.size(self.ref) < max_number_samples:
-            unique_new_thresh = unique_thresh
+        list_fppi = np.empty(thresholds.shape[0], dtype=np.float64)
+        if self.pred.size * thresholds.shape[0] > _PARALLEL_THRESHOLD:
+            with ThreadPoolExecutor(max_workers=os.cpu_count()) as pool:
+                list_fppi[:] = list(pool.map(self.fppi_thr, thresholds))
         else:
-            numb_thresh_temp = np.size(self.ref) / max_number_samples
-            numb_samples_temp = np.size(self.pred) / max_number_thresh
-
-            unique_new_thresh = [0]
-            current_count = 0
-            for (f, c) in zip(unique_thresh, unique_counts):
-                if current_count < numb_samples_temp:
-                    current_count += c
-                    new_thresh = f
-                else:
-                    unique_new_thresh.append(new_thresh)
-                    current_count = 0
-            unique_new_thresh = np.asarray(unique_new_thresh)
+            for i, val in enumerate(thresholds):
+                list_fppi[i] = self.fppi_thr(val)
+        return list_fppi
+
+    def _quantized_threshold_counts(self, pred_flat, max_number_thresh):
+        """
+        Histogram-based variant of the threshold sweep for large volumes.
+
+        Probabilities are binned on a uint16 grid and the TP/FP totals at
+        each occupied level come from reverse cumulative sums of two
+        65536-bin histograms — a single O(N) pass with no sort, after
+        which the cost is independent of the volume size
+
+        :return: descending thresholds and the matching TP/FP counts
+        """
+        pred_q = (
+            np.clip(pred_flat, 0.0, 1.0) * _QUANTIZE_LEVELS
+        ).astype(np.uint16)
+        ref_flat = self._ref_bool.ravel()
+        hist_all = np.bincount(pred_q, minlength=_QUANTIZE_LEVELS + 1)
+        hist_pos = np.bincount(
+            pred_q[ref_flat], minlength=_QUANTIZE_LEVELS + 1
+        )
+        # counts of samples at or above each quantization level
+        tp_cum = np.cumsum(hist_pos[::-1])[::-1].astype(np.float64)
+        fp_cum = np.cumsum(
+            (hist_all - hist_pos)[::-1]
+        )[::-1].astype(np.float64)
+        levels = np.nonzero(hist_all)[0]
+        if levels.size > max_number_thresh:
+            keep = np.linspace(0, levels.size - 1, max_number_thresh)
+            levels = levels[np.unique(keep.astype(np.intp))]
+        levels = levels[::-1]
+        thresh = levels / _QUANTIZE_LEVELS
+        # sentinel above every prediction so the curves start at (0, 0)
         unique_new_thresh = np.concatenate(
-            [unique_new_thresh, np.asarray([1 + np.max(unique_thresh)])]
+            [np.asarray([1.0 + thresh[0]]), thresh]
         )
-        list_sens = []
-        list_spec = []
-        list_ppv = []
-        list_fppi = []
-        unique_new_thresh = np.sort(unique_new_thresh)[::-1]
-        for val in unique_new_thresh:
-            list_sens.append(self.sensitivity_thr(val))
-            list_spec.append(self.specificity_thr(val))
-            list_ppv.append(self.positive_predictive_values_thr(val))
-            list_fppi.append(self.fppi_thr(val))
-        list_ppv[0] = 1.0
-        return unique_new_thresh, list_sens, list_spec, list_ppv, list_fppi
+        tp_at = np.concatenate([np.zeros(1), tp_cum[levels]])
+        fp_at = np.concatenate([np.zeros(1), fp_cum[levels]])
+        return unique_new_thresh, tp_at, fp_at
 
     def __fp_map_thr(self, thresh):
         """
         Map of FP given a specific threshold value
         """
         pred_bin = self.pred >= thresh
-        return np.asarray((pred_bin - self.ref) > 0.0, dtype=np.float32)
+        return pred_bin & ~self._ref_bool
 
     def __fn_map_thr(self, thresh):
         """
@@ -159,7 +352,7 @@ class ProbabilityPairwiseMeasures(object):
         :return: FN map
         """
         pred_bin = self.pred >= thresh
-        return np.asarray((self.ref - pred_bin) > 0.0, dtype=np.float32)
+        return self._ref_bool & ~pred_bin
 
     def __tp_map_thr(self, thresh):
         """
@@ -168,7 +361,7 @@ class ProbabilityPairwiseMeasures(object):
         :return: TP map at specified threshold
         """
         pred_bin = self.pred >= thresh
-        return np.asarray((self.ref + pred_bin) > 1.0, dtype=np.float32)
+        return self._ref_bool & pred_bin
 
     def __tn_map_thr(self, thresh):
         """
@@ -177,7 +370,7 @@ class ProbabilityPairwiseMeasures(object):
         :return: TN map at specified threshold
         """
         pred_bin = self.pred >= thresh
-        return np.asarray((self.ref + pred_bin) < 0.5, dtype=np.float32)
+        return ~self._ref_bool & ~pred_bin
 
     def positive_predictive_values_thr(self, thresh):
         """
@@ -207,14 +400,12 @@ class ProbabilityPairwiseMeasures(object):
 
     def fppi_thr(self, thresh):
         if self.case is not None:
-            list_sum = []
-            for f in range(np.max(self.case)):
-                ind_case = np.where(self.case == f)[0]
-                case_tmp = ProbabilityPairwiseMeasures(
-                    self.pred[ind_case], self.ref[ind_case]
-                )
-                list_sum.append(case_tmp.fp_thr(thresh))
-            fppi = np.mean(np.asarray(list_sum))
+            fp_map = self.__fp_map_thr(thresh).ravel()
+            case_flat = np.asarray(self.case).ravel()
+            per_case = np.bincount(
+                case_flat, weights=fp_map, minlength=int(case_flat.max()) + 1
+            )
+            fppi = per_case.mean()
         else:
             sum_per_image = np.sum(
                 np.reshape(self.__fp_map_thr(thresh), [-1, self.ref.shape[-1]]), axis=0
@@ -245,22 +436,8 @@ class ProbabilityPairwiseMeasures(object):
 
         :return: AUC
         """
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        array_spec = np.asarray(list_spec)
-        array_sens = np.asarray(list_sens)
-        # diff_spec = (1 - array_spec[1:]) - (1 - array_spec[:-1])
-        # diff_sens = array_sens[1:] - array_sens[:-1]
-        # bottom_rect = np.sum(array_sens[:-1] * diff_spec)
-        # top_rect = np.sum(array_sens[1:] * diff_spec)
-        # diff_rect = np.sum(diff_sens * diff_spec)
-        # auroc = bottom_rect + diff_rect * 0.5
-        auroc = trapezoidal_integration(1 - array_spec, array_sens)
+        curves = self.all_multi_threshold_values()
+        auroc = trapezoidal_integration(1 - curves.spec, curves.sens)
         return auroc
 
     def froc(self):
@@ -272,15 +449,9 @@ class ProbabilityPairwiseMeasures(object):
         Comparing and combining algorithms for computer-aided detection of pulmonary nodules in computed tomography
         scans: the ANODE09 study. Medical image analysis 14, 6 (2010), 707–722.
         """
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        array_fppi = np.asarray(list_fppi)
-        array_sens = np.asarray(list_sens)
+        curves = self.all_multi_threshold_values()
+        array_fppi = curves.fppi
+        array_sens = curves.sens
         max_fppi = np.max(array_fppi)
         added_fppi = np.asarray([1.0/8, 1.0/4, 1.0/2, 1, 2, 4, 8])
         added_sens = np.ones([7])*array_sens[-1]
@@ -324,15 +495,9 @@ class ProbabilityPairwiseMeasures(object):
         :return: AP
 
         """
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
+        curves = self.all_multi_threshold_values()
 
-        ap = trapezoidal_integration(np.asarray(list_sens), np.asarray(list_ppv))
+        ap = trapezoidal_integration(curves.sens, curves.ppv)
         # diff_ppv = np.asarray(list_ppv[1:]) - np.asarray(list_ppv[:-1])
         # diff_sens = np.asarray(list_sens[1:]) - np.asarray(list_sens[:-1])
         # bottom_rect = np.sum(np.asarray(list_ppv[:-1]) * diff_sens)
@@ -355,19 +520,10 @@ class ProbabilityPairwiseMeasures(object):
             value_spec = self.dict_args["value_specificity"]
         else:
             value_spec = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_spec = np.asarray(list_spec)
-        # ind_values = np.where(array_spec >= value_spec)
-        # array_sens = np.asarray(list_sens)
-        # sens_valid = array_sens[ind_values]
-        # value_max = np.max(sens_valid)
-        value_max = max_x_at_y_more(list_sens, list_spec, value_spec)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_more(
+            curves.sens[::-1], curves.spec[::-1], value_spec, sorted_y=True
+        )
         return value_max
 
     def specificity_at_sensitivity(self):
@@ -381,19 +537,10 @@ class ProbabilityPairwiseMeasures(object):
             value_sens = self.dict_args["value_sensitivity"]
         else:
             value_sens = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_spec = np.asarray(list_spec)
-        # array_sens = np.asarray(list_sens)
-        # ind_values = np.where(array_sens >= value_sens)
-        # spec_valid = array_spec[ind_values]
-        # value_max = np.max(spec_valid)
-        value_max = max_x_at_y_more(list_spec, list_sens, value_sens)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_more(
+            curves.spec, curves.sens, value_sens, sorted_y=True
+        )
         return value_max
 
     def fppi_at_sensitivity(self):
@@ -407,19 +554,10 @@ class ProbabilityPairwiseMeasures(object):
             value_sens = self.dict_args["value_sensitivity"]
         else:
             value_sens = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_fppi = np.asarray(list_fppi)
-        # array_sens = np.asarray(list_sens)
-        # ind_values = np.where(array_sens >= value_sens)
-        # fppi_valid = array_fppi[ind_values]
-        # value_max = np.max(fppi_valid)
-        value_max = max_x_at_y_more(list_fppi, list_sens, value_sens)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_more(
+            curves.fppi, curves.sens, value_sens, sorted_y=True
+        )
         return value_max
 
     def sensitivity_at_fppi(self):
@@ -433,19 +571,10 @@ class ProbabilityPairwiseMeasures(object):
             value_fppi = self.dict_args["value_fppi"]
         else:
             value_fppi = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_fppi = np.asarray(list_fppi)
-        # array_sens = np.asarray(list_sens)
-        # ind_values = np.where(array_fppi <= value_fppi)
-        # sens_valid = array_sens[ind_values]
-        # value_max = np.max(sens_valid)
-        value_max = max_x_at_y_less(list_sens, list_fppi, value_fppi)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_less(
+            curves.sens, curves.fppi, value_fppi, sorted_y=True
+        )
         return value_max
 
     def sensitivity_at_ppv(self):
@@ -459,19 +588,8 @@ class ProbabilityPairwiseMeasures(object):
             value_ppv = self.dict_args["value_ppv"]
         else:
             value_ppv = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_ppv = np.asarray(list_ppv)
-        # array_sens = np.asarray(list_sens)
-        # ind_values = np.where(array_ppv >= value_ppv)
-        # sens_valid = array_sens[ind_values]
-        # value_max = np.max(sens_valid)
-        value_max = max_x_at_y_more(list_sens, list_ppv, value_ppv)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_more(curves.sens, curves.ppv, value_ppv)
         return value_max
 
     def ppv_at_sensitivity(self):
@@ -485,19 +603,10 @@ class ProbabilityPairwiseMeasures(object):
             value_sens = self.dict_args["value_sensitivity"]
         else:
             value_sens = 0.8
-        (
-            unique_thresh,
-            list_sens,
-            list_spec,
-            list_ppv,
-            list_fppi,
-        ) = self.all_multi_threshold_values()
-        # array_ppv = np.asarray(list_ppv)
-        # array_sens = np.asarray(list_sens)
-        # ind_values = np.where(array_sens >= value_sens)
-        # ppv_valid = array_ppv[ind_values]
-        # value_max = np.max(ppv_valid)
-        value_max = max_x_at_y_more(list_ppv, list_sens, value_sens)
+        curves = self.all_multi_threshold_values()
+        value_max = max_x_at_y_more(
+            curves.ppv, curves.sens, value_sens, sorted_y=True
+        )
         return value_max
 
     def to_dict_meas(self, fmt="{:.4f}"):
@@ -506,7 +615,7 @@ class ProbabilityPairwiseMeasures(object):
         """
         result_dict = {}
         for key in self.measures:
-            result = self.measures_dict[key][0]()
+            result = getattr(self, self._MEASURES[key][0])()
             #result_dict[key] = fmt.format(result)
             result_dict[key] = result
         return result_dict  # trim the last comma
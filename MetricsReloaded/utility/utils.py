@@ -83,7 +83,12 @@ class CacheFunctionOutput(object):
             cache = obj.__cache
         except AttributeError:
             cache = obj.__cache = {}
-        key = (self.func, args[1:], frozenset(kw.items()))
+        if len(args) == 1 and not kw:
+            # common zero-argument method: key on the function alone and
+            # skip the tuple/frozenset construction
+            key = self.func
+        else:
+            key = (self.func, args[1:], frozenset(kw.items()))
         try:
             value = cache[key]
         except KeyError:
@@ -100,6 +105,7 @@ class MorphologyOps(object):
     def __init__(self, binary_img, connectivity):
         self.binary_map = np.asarray(binary_img, dtype=np.int8)
         self.connectivity = connectivity
+        self._erosion_buf = None
 
     def border_map(self):
         """
@@ -108,8 +114,11 @@ class MorphologyOps(object):
 
         :return: border
         """
-        eroded = ndimage.binary_erosion(self.binary_map)
-        border = self.binary_map - eroded
+        binary_bool = self.binary_map.astype(bool, copy=False)
+        if self._erosion_buf is None:
+            self._erosion_buf = np.empty(self.binary_map.shape, dtype=bool)
+        ndimage.binary_erosion(binary_bool, output=self._erosion_buf)
+        border = binary_bool & ~self._erosion_buf
         return border
 
     def border_map2(self):
@@ -117,33 +126,31 @@ class MorphologyOps(object):
         Creates the border for a 3D image
         :return:
         """
-        west = ndimage.shift(self.binary_map, [-1, 0, 0], order=0)
-        east = ndimage.shift(self.binary_map, [1, 0, 0], order=0)
-        north = ndimage.shift(self.binary_map, [0, 1, 0], order=0)
-        south = ndimage.shift(self.binary_map, [0, -1, 0], order=0)
-        top = ndimage.shift(self.binary_map, [0, 0, 1], order=0)
-        bottom = ndimage.shift(self.binary_map, [0, 0, -1], order=0)
-        cumulative = west + east + north + south + top + bottom
-        border = ((cumulative < 6) * self.binary_map) == 1
+        padded = np.pad(self.binary_map, 1, mode="constant")
+        cumulative = (
+            padded[:-2, 1:-1, 1:-1]
+            + padded[2:, 1:-1, 1:-1]
+            + padded[1:-1, :-2, 1:-1]
+            + padded[1:-1, 2:, 1:-1]
+            + padded[1:-1, 1:-1, :-2]
+            + padded[1:-1, 1:-1, 2:]
+        )
+        border = (cumulative < 6) & (self.binary_map == 1)
         return border
 
     def foreground_component(self):
         return ndimage.label(self.binary_map)
 
     def list_foreground_component(self):
-        labels, _ = self.foreground_component()
-        list_ind_lab = []
-        list_volumes = []
-        list_com = []
-        list_values = np.unique(labels)
-        for f in list_values:
-            if f > 0:
-                tmp_lab = np.where(
-                    labels == f, np.ones_like(labels), np.zeros_like(labels)
-                )
-                list_ind_lab.append(tmp_lab)
-                list_volumes.append(np.sum(tmp_lab))
-                list_com.append(ndimage.center_of_mass(tmp_lab))
+        labels, num_labels = self.foreground_component()
+        index = np.arange(1, num_labels + 1)
+        list_volumes = list(
+            np.bincount(labels.ravel(), minlength=num_labels + 1)[1:]
+        )
+        list_com = ndimage.center_of_mass(self.binary_map, labels, index)
+        list_ind_lab = [
+            (labels == f).astype(labels.dtype) for f in index
+        ]
         return list_ind_lab, list_volumes, list_com
 
 def intersection_boxes(box1, box2):
@@ -289,21 +296,33 @@ def distance_transform_edt(img, sampling=None):
             img, sampling=sampling, return_indices=False
         )
 
-def max_x_at_y_more(x, y, cut_off):
+def max_x_at_y_more(x, y, cut_off, sorted_y=False):
     """Gets max of elements in x where elements 
     in y are geq to a cut off value
+
+    When sorted_y is True, y must be sorted ascending and the eligible
+    tail is found with searchsorted instead of a full boolean mask
     """
     x = np.asarray(x)
-    y = np.asarray(y)    
+    y = np.asarray(y)
+    if sorted_y:
+        ix = np.searchsorted(y, cut_off, side="left")
+        return np.max(x[ix:])
     ix = np.where(y >= cut_off)
     return np.max(x[ix])
 
-def max_x_at_y_less(x, y, cut_off):
+def max_x_at_y_less(x, y, cut_off, sorted_y=False):
     """Gets max of elements in x where elements 
     in y are leq to a cut off value
+
+    When sorted_y is True, y must be sorted ascending and the eligible
+    head is found with searchsorted instead of a full boolean mask
     """
     x = np.asarray(x)
-    y = np.asarray(y)    
+    y = np.asarray(y)
+    if sorted_y:
+        ix = np.searchsorted(y, cut_off, side="right")
+        return np.max(x[:ix])
     ix = np.where(y <= cut_off)
     return np.max(x[ix])
 